@@ -1,5 +1,6 @@
 """first attempt connecting to IB"""
-import time
+import sys
+import threading
 
 from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
@@ -8,11 +9,22 @@ class IBapi(EWrapper, EClient):
     """Wrapper for IB Client API"""
     def __init__(self):
         EClient.__init__(self, self)
+        self.connected = threading.Event()
+
+    def nextValidId(self, orderId):
+        #TWS sends this once the connection is ready for requests
+        self.connected.set()
 
 app = IBapi()
 app.connect('127.0.0.1', 7496, 80907)
-app.run()
-
+api_thread = threading.Thread(target=app.run, daemon=True)
+api_thread.start()
 
-time.sleep(2)
+if app.connected.wait(timeout=5):
+    print("Connected to TWS")
+else:
+    print("Could not connect to TWS")
 app.disconnect()
+api_thread.join(timeout=2)
+if not app.connected.is_set():
+    sys.exit(1)
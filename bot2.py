@@ -1,4 +1,6 @@
 """Get AAPL market data"""
+import collections
+import sys
 import threading
 import time
 
@@ -7,6 +9,15 @@ from ibapi.wrapper import EWrapper
 from ibapi.contract import Contract
 from ibapi.ticktype import TickTypeEnum
 
+#Price fields we keep, by tick type. Delayed data (market data type 3)
+#arrives as the DELAYED_* types, so they map to the same fields.
+TICK_FIELDS = {TickTypeEnum.BID: 'bid',
+               TickTypeEnum.ASK: 'ask',
+               TickTypeEnum.LAST: 'last',
+               TickTypeEnum.DELAYED_BID: 'bid',
+               TickTypeEnum.DELAYED_ASK: 'ask',
+               TickTypeEnum.DELAYED_LAST: 'last'}
+
 
 class TestWrapper(EWrapper):
     """inbound"""
@@ -21,29 +32,48 @@ class TestApp(TestWrapper, TestClient):
     def __init__(self):
         TestWrapper.__init__(self)
         TestClient.__init__(self, wrapper=self)
+        #Set by the API thread once TWS accepted the connection
+        self.connected = threading.Event()
+        #Ticks received by the API thread, drained by the main thread.
+        #deque.append and deque.popleft are atomic, so this needs no lock
+        #as long as only the API thread appends and only the main thread pops.
+        self.ticks = collections.deque()
+        self.tick_arrived = threading.Event()
+        #Latest price per field, only touched by the main thread
+        self.prices = {}
+
+    def nextValidId(self, orderId):
+        #TWS sends this once the connection is ready for requests
+        self.connected.set()
 
     def tickPrice(self, reqId, tickType, price, attrib):
-        print("tickPrice method was invoked")
-        print("ticktype: ", tickType)
-        if reqId==1:
+        #Runs on the API thread, just hand the tick over to the main thread
+        self.ticks.append((reqId, tickType, price))
+        self.tick_arrived.set()
+
+    def process_ticks(self):
+        """Print all queued ticks"""
+        #Local aliases, the loop body runs once per tick
+        ticks = self.ticks
+        next_tick = ticks.popleft
+        field_of = TICK_FIELDS.get
+        prices = self.prices
+        while ticks:
+            reqId, tickType, price = next_tick()
+            if reqId != 1:
+                continue
+            print("ticktype: ", tickType)
             print("price is ", price)
-        if tickType == 2 and reqId == 1:
-            print('The current ask price is: ', price)
-            
+            field = field_of(tickType)
+            if field is not None:
+                prices[field] = price
+                print('The current', field, 'price is: ', price)
+
 def run_loop():
     """Run again and again"""
     print("Inside run looop")
     app.run()
      
-print("Creating TestApp")
-app = TestApp()
-app.connect('127.0.0.1', 7496, 80907)
-print("Creating thread for connection")
-api_thread = threading.Thread(target=run_loop, daemon=True)
-api_thread.start()
-print("Waiting for 1s")
-time.sleep(1) #Sleep interval to allow time for connection to server
-
 #Create contract object
 apple_contract = Contract()
 apple_contract.symbol = 'AAPL'
@@ -51,6 +81,18 @@ apple_contract.secType = 'STK'
 apple_contract.exchange = 'SMART'
 apple_contract.currency = 'USD'
 
+print("Creating TestApp")
+app = TestApp()
+app.connect('127.0.0.1', 7496, 80907)
+print("Creating thread for connection")
+api_thread = threading.Thread(target=run_loop, daemon=True)
+api_thread.start()
+print("Waiting for connection")
+if not app.connected.wait(timeout=5): #Allow time for connection to server
+    print("Could not connect to TWS")
+    app.disconnect()
+    sys.exit(1)
+
 #Request Market Data
 """3...Delayed data without subscription"""
 print("setting delayed market data")
@@ -64,5 +106,17 @@ app.reqMktData(reqId=1,
                mktDataOptions=[])
 
 
-time.sleep(30) #Sleep interval to allow time for incoming price data
+#Allow time for incoming price data, printing it as soon as it arrives
+deadline = time.monotonic() + 30
+while True:
+    app.process_ticks()
+    if 'ask' in app.prices: #Live or delayed ask, that is what we came for
+        break
+    remaining = deadline - time.monotonic()
+    if remaining <= 0 or not app.tick_arrived.wait(remaining):
+        break
+    app.tick_arrived.clear()
+app.cancelMktData(1)
 app.disconnect()
+#Let the API thread leave app.run() instead of killing it on exit
+api_thread.join(timeout=2)